@@ -1,94 +1,271 @@
 import streamlit as st
-import google.generativeai as genai
-import requests # New import for Firebase REST API
-import json # New import for JSON handling
+import markdown2 # Pre-render chat markdown so history replays skip parsing
+import httpx # Async HTTP client for Firebase REST API
+import orjson # Fast JSON serialization for auth payloads
+import asyncio # For running async auth calls
+import threading # Daemon thread hosting the auth event loop
+import time # For throttling streamed UI updates
+import math # Cosine similarity for the semantic cache
+import collections # Bounded deques for chat history
+from concurrent.futures import ThreadPoolExecutor # Offload blocking Gemini calls
 
 # --- Configuration for Google Gemini API ---
-if "GOOGLE_API_KEY" in st.secrets:
-    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
-else:
-    st.error("Google API Key not found in Streamlit secrets. Please add it to .streamlit/secrets.toml")
-    st.stop()
-
 MODEL_NAME = "gemini-1.5-flash-latest" # Using the working model
 
-try:
-    gemini_model = genai.GenerativeModel(MODEL_NAME) # Renamed to avoid conflict
-except Exception as e:
-    st.error(f"Failed to load model '{MODEL_NAME}': {e}")
-    st.info("Please check the model name or your API key/network connection.")
-    st.stop()
-
-# --- Firebase Configuration from Streamlit secrets ---
-# Ensure these keys exist in .streamlit/secrets.toml
-FIREBASE_API_KEY = st.secrets.get("FIREBASE_API_KEY")
-FIREBASE_AUTH_DOMAIN = st.secrets.get("FIREBASE_AUTH_DOMAIN")
-FIREBASE_PROJECT_ID = st.secrets.get("FIREBASE_PROJECT_ID")
-FIREBASE_APP_ID = st.secrets.get("FIREBASE_APP_ID")
+# Fixed framing sent with every translation as the system instruction,
+# so the per-request prompt carries only the language pair and text.
+# This prefix is far below Gemini's minimum cacheable size (~2048
+# tokens), so server-side context caching isn't worth an API call here;
+# revisit if few-shot examples or tool specs grow the prefix.
+TRANSLATOR_INSTRUCTION = (
+    "You are a professional translator. Translate the user's text exactly, "
+    "preserving tone, formatting, and punctuation. Reply with only the "
+    "translated text, without explanations or commentary."
+)
+# Compiled once; %-substitution per call is cheaper than rebuilding the
+# f-string on the hot path
+PROMPT_TEMPLATE = 'Translate the following %s text to %s: "%s"'
+
+@st.cache_resource
+def _genai():
+    # Imported lazily so the login/register path never pays the gRPC and
+    # protobuf import cost; configured once per server
+    import google.generativeai as genai
+    if "GOOGLE_API_KEY" not in st.secrets:
+        st.error("Google API Key not found in Streamlit secrets. Please add it to .streamlit/secrets.toml")
+        st.stop()
+    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
+    return genai
 
-if not all([FIREBASE_API_KEY, FIREBASE_AUTH_DOMAIN, FIREBASE_PROJECT_ID, FIREBASE_APP_ID]):
-    st.error("Missing Firebase configuration in .streamlit/secrets.toml. Please check your setup.")
-    st.stop()
+@st.cache_resource
+def get_gemini_model():
+    # Cached so the client is built once per server, not on every rerun
+    genai = _genai()
+    try:
+        return genai.GenerativeModel(MODEL_NAME, system_instruction=TRANSLATOR_INSTRUCTION)
+    except Exception as e:
+        st.error(f"Failed to load model '{MODEL_NAME}': {e}")
+        st.info("Please check the model name or your API key/network connection.")
+        st.stop()
+
+@st.cache_resource
+def get_pool():
+    # Shared worker pool so blocking SDK iteration never holds the
+    # Streamlit script thread
+    return ThreadPoolExecutor(max_workers=4)
+
+def _consume_stream(stream, parts):
+    # Runs on a pool worker; list.append is thread-safe under the GIL
+    for chunk in stream:
+        parts.append(chunk.text)
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def translate_cached(source_language, target_language, text, _placeholder):
+    # Exact-match cache: repeating the same (source, target, text) skips
+    # the Gemini round-trip entirely. On a miss, the leading-underscore
+    # _placeholder (excluded from the cache key) receives streamed chunks.
+    translation_prompt = PROMPT_TEMPLATE % (source_language, target_language, text)
+    stream = get_gemini_model().generate_content(translation_prompt, stream=True)
+    parts = []
+    future = get_pool().submit(_consume_stream, stream, parts)
+    while not future.done():
+        # Poll at ~50ms so fast token streams don't trigger a full
+        # rerender per chunk
+        time.sleep(0.05)
+        if parts:
+            _placeholder.markdown("".join(parts))
+    future.result() # Propagate stream errors to the caller
+    # Materialize the full text once; the caller does the final flush
+    return "".join(parts)
+
+# --- Semantic cache: catches near-duplicates ("hello" vs "Hello!") that
+# the exact-match cache above misses ---
+SEMANTIC_CACHE_MAX = 100
+SEMANTIC_SIMILARITY_THRESHOLD = 0.95
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def _embed(text):
+    return _genai().embed_content(model="text-embedding-004", content=text)["embedding"]
+
+def _cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = math.sqrt(sum(x * x for x in a))
+    norm_b = math.sqrt(sum(x * x for x in b))
+    if not norm_a or not norm_b:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+def semantic_cache_lookup(source_language, target_language, text):
+    cache = st.session_state.get("sem_cache", [])
+    if not cache:
+        return None
+    embedding = _embed(text)
+    for i, (cached_embedding, src, tgt, translation) in enumerate(cache):
+        if src != source_language or tgt != target_language:
+            continue
+        if _cosine_similarity(embedding, cached_embedding) > SEMANTIC_SIMILARITY_THRESHOLD:
+            cache.append(cache.pop(i)) # Refresh LRU position
+            return translation
+    return None
+
+def semantic_cache_store(source_language, target_language, text, translation):
+    cache = st.session_state.setdefault("sem_cache", [])
+    cache.append((_embed(text), source_language, target_language, translation))
+    if len(cache) > SEMANTIC_CACHE_MAX:
+        del cache[0] # Evict least recently used
 
+# --- Firebase Configuration from Streamlit secrets ---
 # Base URL for Firebase Authentication REST API
 FIREBASE_AUTH_URL = f"https://identitytoolkit.googleapis.com/v1/accounts:"
 
+@st.cache_resource
+def firebase_config():
+    # Validated once per server instead of re-reading the secrets proxy
+    # on every rerun. Ensure these keys exist in .streamlit/secrets.toml
+    config = {key: st.secrets.get(key) for key in (
+        "FIREBASE_API_KEY", "FIREBASE_AUTH_DOMAIN", "FIREBASE_PROJECT_ID", "FIREBASE_APP_ID")}
+    if not all(config.values()):
+        st.error("Missing Firebase configuration in .streamlit/secrets.toml. Please check your setup.")
+        st.stop()
+    return config
+
 
 # --- Firebase Authentication Functions ---
 
+@st.cache_resource
+def _auth_loop():
+    # Persistent event loop on a daemon thread so the pooled client
+    # below outlives individual asyncio.run-style calls
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="auth-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource
+def _auth_client():
+    # One pooled client per server so keep-alive (and HTTP/2) reuses the
+    # TLS connection to identitytoolkit.googleapis.com across auth calls
+    return httpx.AsyncClient(http2=True, timeout=10)
+
+async def _post_auth_async(client, url, payload):
+    # Async so future auth-adjacent calls (token reverify, profile
+    # prefetch) can fan out with asyncio.gather instead of serializing.
+    # orjson emits bytes directly, skipping httpx's json encode + str
+    # round-trip.
+    return await client.post(
+        url,
+        content=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+    )
+
+def _post_auth(url, payload):
+    coro = _post_auth_async(_auth_client(), url, payload)
+    return asyncio.run_coroutine_threadsafe(coro, _auth_loop()).result()
+
 def signup_user(email, password):
-    url = f"{FIREBASE_AUTH_URL}signUp?key={FIREBASE_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    payload = json.dumps({"email": email, "password": password, "returnSecureToken": True})
+    url = f"{FIREBASE_AUTH_URL}signUp?key={firebase_config()['FIREBASE_API_KEY']}"
+    payload = {"email": email, "password": password, "returnSecureToken": True}
     try:
-        response = requests.post(url, headers=headers, data=payload)
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        response = _post_auth(url, payload)
+        body = response.json() # Parse once; success and error both read from it
+    except (httpx.HTTPError, ValueError) as e:
         st.error(f"Signup failed: {e}")
-        if response.status_code == 400: # Specific Firebase error for existing user, weak password, etc.
-            error_data = response.json().get('error', {})
-            st.error(f"Error: {error_data.get('message', 'Unknown Firebase error')}")
         return None
+    if response.is_success:
+        return body
+    # Firebase reports existing user, weak password, etc. in the body
+    error_data = body.get('error', {})
+    st.error(f"Signup failed: {error_data.get('message', 'Unknown Firebase error')}")
+    return None
 
 def login_user(email, password):
-    url = f"{FIREBASE_AUTH_URL}signInWithPassword?key={FIREBASE_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    payload = json.dumps({"email": email, "password": password, "returnSecureToken": True})
+    url = f"{FIREBASE_AUTH_URL}signInWithPassword?key={firebase_config()['FIREBASE_API_KEY']}"
+    payload = {"email": email, "password": password, "returnSecureToken": True}
     try:
-        response = requests.post(url, headers=headers, data=payload)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        response = _post_auth(url, payload)
+        body = response.json() # Parse once; success and error both read from it
+    except (httpx.HTTPError, ValueError) as e:
         st.error(f"Login failed: {e}")
-        if response.status_code == 400:
-            error_data = response.json().get('error', {})
-            st.error(f"Error: {error_data.get('message', 'Invalid credentials or Firebase error')}")
         return None
+    if response.is_success:
+        return body
+    error_data = body.get('error', {})
+    st.error(f"Login failed: {error_data.get('message', 'Invalid credentials or Firebase error')}")
+    return None
 
 def logout_user():
     st.session_state.logged_in = False
     st.session_state.user_info = None
-    st.session_state.messages = [] # Clear chat on logout
+    st.session_state.messages = _new_message_columns() # Clear chat on logout
+    # Drop session caches too, so a different account logging in from
+    # this browser session can't be served the previous user's content
+    st.session_state.pop("sem_cache", None)
+    st.session_state.pop("render_cache", None)
+    st.session_state.pop("show_all_messages", None)
     st.rerun() # Force rerun to show login screen
 
+# --- Chat history storage ---
+# History is kept struct-of-arrays style: one column per field, indexed
+# together, instead of a dict per message. Each column is a bounded
+# deque, so very long sessions evict the oldest messages in lockstep
+# instead of growing without limit.
+
+# Hard cap on stored messages; the oldest are dropped past this
+MAX_MESSAGES = 200
+
+def _new_message_columns():
+    return {field: collections.deque(maxlen=MAX_MESSAGES) for field in ("role", "content", "src", "tgt")}
+
+def append_message(role, content, src=None, tgt=None):
+    messages = st.session_state.messages
+    messages["role"].append(role)
+    messages["content"].append(content)
+    messages["src"].append(src)
+    messages["tgt"].append(tgt)
+
+def message_count():
+    return len(st.session_state.messages["role"])
+
+# How many chat messages to render per rerun; older ones stay in
+# history behind the "Show earlier messages" button
+MAX_VISIBLE_MESSAGES = 50
+
+# How many pre-rendered message bodies to keep per session
+RENDER_CACHE_MAX = 100
+
+def render_message(role, content):
+    # Historical messages never change, so the markdown->HTML conversion
+    # is done once per (role, content) and replayed from a session cache.
+    # safe_mode escapes raw inline HTML in user/model text, matching the
+    # escaping st.markdown would apply on its own.
+    cache = st.session_state.setdefault("render_cache", {})
+    key = (role, content)
+    html = cache.get(key)
+    if html is None:
+        html = markdown2.markdown(content, safe_mode="escape")
+        if len(cache) >= RENDER_CACHE_MAX:
+            cache.pop(next(iter(cache))) # Evict the oldest entry
+        cache[key] = html
+    st.markdown(html, unsafe_allow_html=True)
+
 # --- Language Options ---
-LANGUAGES = {
-    "English": "English",
-    "Hindi": "Hindi",
-    "Spanish": "Spanish",
-    "French": "French",
-    "German": "German",
-    "Japanese": "Japanese",
-    "Chinese (Simplified)": "Chinese (Simplified)",
-    "Telugu": "Telugu",
-    "Tamil": "Tamil",
-    "Kannada": "Kannada",
-    "Malayalam": "Malayalam",
-    "Bengali": "Bengali",
-    "Gujarati": "Gujarati",
-    "Punjabi": "Punjabi"
-}
+# Built once at import; reruns reuse the same tuple instead of
+# materializing a fresh list for each selectbox
+LANGUAGE_NAMES = (
+    "English",
+    "Hindi",
+    "Spanish",
+    "French",
+    "German",
+    "Japanese",
+    "Chinese (Simplified)",
+    "Telugu",
+    "Tamil",
+    "Kannada",
+    "Malayalam",
+    "Bengali",
+    "Gujarati",
+    "Punjabi"
+)
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="AI Language Translator", layout="centered")
@@ -99,6 +276,73 @@ if "logged_in" not in st.session_state:
 if "user_info" not in st.session_state:
     st.session_state.user_info = None
 
+@st.fragment
+def translator_fragment(source_language, target_language):
+    # Fragment-scoped: sending a message reruns only this body, not the
+    # whole script. st.sidebar isn't allowed inside a fragment, so the
+    # language selectors live in the main script and are passed in.
+    # Display existing chat messages from history; only the tail is
+    # rendered so long sessions don't redraw every message each rerun
+    messages = st.session_state.messages
+    count = message_count()
+    if st.session_state.get("show_all_messages"):
+        start = 0
+    else:
+        start = max(0, count - MAX_VISIBLE_MESSAGES)
+        if count > MAX_VISIBLE_MESSAGES:
+            st.button("Show earlier messages", on_click=lambda: st.session_state.update(show_all_messages=True))
+    for i in range(start, count):
+        role = messages["role"][i]
+        with st.chat_message(role):
+            if role == "user" and messages["src"][i] and messages["tgt"][i]:
+                st.markdown(f"**From {messages['src'][i]} to {messages['tgt'][i]}**")
+            render_message(role, messages["content"][i])
+
+    # Chat input for new messages
+    if prompt := st.chat_input("Type text to translate...", key="chat_input_text"):
+        # Add user message to chat history
+        append_message("user", prompt, source_language, target_language)
+
+        # Display user message immediately
+        with st.chat_message("user"):
+            st.markdown(f"**From {source_language} to {target_language}**")
+            st.markdown(prompt)
+
+        if source_language == target_language:
+            # Nothing to translate; echo the input without a model call
+            with st.chat_message("assistant"):
+                st.markdown(prompt)
+            append_message("assistant", prompt)
+        else:
+            with st.spinner(f"Translating from {source_language} to {target_language}..."):
+                try:
+                    # Display assistant response incrementally as chunks arrive;
+                    # cached translations appear instantly
+                    with st.chat_message("assistant"):
+                        placeholder = st.empty()
+                        translated_text = semantic_cache_lookup(source_language, target_language, prompt)
+                        if translated_text is None:
+                            translated_text = translate_cached(source_language, target_language, prompt, placeholder)
+                            semantic_cache_store(source_language, target_language, prompt, translated_text)
+                        placeholder.markdown(translated_text)
+
+                    # Add assistant response to chat history
+                    append_message("assistant", translated_text)
+
+                except Exception as e:
+                    error_message = f"An error occurred during translation: {e}"
+                    st.error(error_message)
+                    st.info("Please try again or check your API key/network connection. Quota limits might also apply.")
+                    append_message("assistant", f"Error: {error_message}")
+
+    st.markdown("---")
+
+    # Clear chat history button
+    if st.button("Clear Chat", help="Clear all messages from the conversation history"):
+        st.session_state.messages = _new_message_columns()
+        append_message("assistant", "Chat cleared! How can I help you now?")
+        st.rerun()
+
 # --- Main App Logic (Conditional based on login status) ---
 if st.session_state.logged_in:
     # --- Authenticated User UI (Translator App) ---
@@ -111,69 +355,20 @@ if st.session_state.logged_in:
 
     # Initialize chat history in session state if it doesn't exist
     if "messages" not in st.session_state:
-        st.session_state.messages = []
-        st.session_state.messages.append({"role": "assistant", "content": "Hello! I'm your AI translator. Select languages and type to translate."})
+        st.session_state.messages = _new_message_columns()
+        append_message("assistant", "Hello! I'm your AI translator. Select languages and type to translate.")
 
     # Language Selection controls at the top
     st.sidebar.subheader("Language Settings")
     col1_sidebar, col2_sidebar = st.sidebar.columns(2)
     with col1_sidebar:
-        source_language = st.selectbox("Source Language", list(LANGUAGES.keys()), index=0, key="source_lang_select")
+        source_language = st.selectbox("Source Language", LANGUAGE_NAMES, index=0, key="source_lang_select")
     with col2_sidebar:
-        target_language = st.selectbox("Target Language", list(LANGUAGES.keys()), index=1, key="target_lang_select")
+        target_language = st.selectbox("Target Language", LANGUAGE_NAMES, index=1, key="target_lang_select")
 
     st.sidebar.markdown("---")
 
-    # Display existing chat messages from history
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            if message["role"] == "user" and "source_lang" in message and "target_lang" in message:
-                st.markdown(f"**From {message['source_lang']} to {message['target_lang']}**")
-                st.markdown(message["content"])
-            else:
-                st.markdown(message["content"])
-
-    # Chat input for new messages
-    if prompt := st.chat_input("Type text to translate...", key="chat_input_text"):
-        # Add user message to chat history
-        st.session_state.messages.append({
-            "role": "user",
-            "content": prompt,
-            "source_lang": source_language,
-            "target_lang": target_language
-        })
-
-        # Display user message immediately
-        with st.chat_message("user"):
-            st.markdown(f"**From {source_language} to {target_language}**")
-            st.markdown(prompt)
-
-        with st.spinner(f"Translating from {source_language} to {target_language}..."):
-            try:
-                translation_prompt = f"Translate the following {source_language} text to {target_language}: \"{prompt}\""
-                response = gemini_model.generate_content(translation_prompt) # Use gemini_model
-                translated_text = response.text
-
-                # Add assistant response to chat history
-                st.session_state.messages.append({"role": "assistant", "content": translated_text})
-
-                # Display assistant response
-                with st.chat_message("assistant"):
-                    st.markdown(translated_text)
-
-            except Exception as e:
-                error_message = f"An error occurred during translation: {e}"
-                st.error(error_message)
-                st.info("Please try again or check your API key/network connection. Quota limits might also apply.")
-                st.session_state.messages.append({"role": "assistant", "content": f"Error: {error_message}"})
-
-    st.markdown("---")
-
-    # Clear chat history button
-    if st.button("Clear Chat", help="Clear all messages from the conversation history"):
-        st.session_state.messages = []
-        st.session_state.messages.append({"role": "assistant", "content": "Chat cleared! How can I help you now?"})
-        st.rerun()
+    translator_fragment(source_language, target_language)
 
     st.caption("Disclaimer: Translations are generated by AI and may not always be perfectly accurate. This is a demo app.")
 